@@ -5,6 +5,10 @@ Standardizes player names, creates player IDs, and cleans all tennis datasets
 
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+import functools
 import hashlib
 import re
 from pathlib import Path
@@ -12,9 +16,121 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
+# Player ID scheme: 1 = truncated MD5 (legacy), 2 = 4-byte BLAKE2b.
+# IDs differ between versions, so reprocess all data after changing this.
+PLAYER_ID_VERSION = 2
+
+# Precompiled name / column normalization patterns
+_WS = re.compile(r'\s+')
+_NAME_FORMAT = re.compile(r'^([A-Z][a-z]+) ([A-Z])\.$')
+_COL_BAD = re.compile(r'[^\w\s%]')
+
+# CSV reading: multithreaded pyarrow parser, explicit dtypes for the matches file
+_READ_KW = dict(engine='pyarrow')
+_MATCH_DTYPES = {
+    'Tournament': 'string',
+    'Series': 'string',
+    'Surface': 'string',
+    'Round': 'string',
+    'Player_1': 'string',
+    'Player_2': 'string',
+    'Winner': 'string',
+    'Rank_1': 'Int32',
+    'Rank_2': 'Int32',
+    'Pts_1': 'Int32',
+    'Pts_2': 'Int32',
+    'Odd_1': 'float64',
+    'Odd_2': 'float64',
+    'Best of': 'Int8',
+    'Score': 'string'
+}
+_MATCH_COLUMNS = ['Date'] + list(_MATCH_DTYPES)
+_PLAYER_COLUMNS = ['Player_1', 'Player_2', 'Winner']
+
+# Processed tables are written as typed, compressed Parquet
+_PARQUET_KW = dict(engine='pyarrow', compression='snappy', index=False)
+
+# Lowercased surface label -> standard surface (unknown labels default to Hard)
+SURFACE_MAPPING = {
+    'hard': 'Hard',
+    'clay': 'Clay', 
+    'grass': 'Grass',
+    'carpet': 'Carpet',
+    'acrylic': 'Hard',
+    'decoturf': 'Hard',
+    'plexicushion': 'Hard',
+    'rebound ace': 'Hard',
+    'greenset': 'Hard'
+}
+
+# Round label -> standard round (unknown labels are kept as-is)
+ROUND_MAPPING = {
+    '1st Round': 'R1',
+    '2nd Round': 'R2', 
+    '3rd Round': 'R3',
+    '4th Round': 'R4',
+    'Round of 128': 'R1',
+    'Round of 64': 'R2',
+    'Round of 32': 'R3',
+    'Round of 16': 'R4',
+    'Quarterfinals': 'QF',
+    'Quarter-finals': 'QF',
+    'Semifinals': 'SF',
+    'Semi-finals': 'SF',
+    'The Final': 'F',
+    'Final': 'F',
+    'Finals': 'F'
+}
+
+@functools.lru_cache(maxsize=None)
+def normalize_player_name(name):
+    """Standardize player names for consistent identification"""
+    if pd.isna(name) or name == "":
+        return None
+        
+    # Remove extra whitespace (multiple spaces to single)
+    words = str(name).split()
+    
+    # Common name format fixes
+    # "Lastname F." -> "F. Lastname" 
+    if len(words) == 2:
+        match = _NAME_FORMAT.match(f"{words[0]} {words[1]}")
+        if match:
+            words = [f"{match.group(2)}.", match.group(1)]
+    
+    # Handle "Lastname First" -> "First Lastname"
+    # This is tricky, we'll keep current format but standardize case
+    return ' '.join(word.capitalize() for word in words)
+
+def clean_column_name(col):
+    """Remove special characters from a column name and snake_case it"""
+    return _WS.sub('_', _COL_BAD.sub('', str(col)).strip()).lower()
+
+def create_player_id(name, version=None):
+    """Create consistent player ID using hash of normalized name.
+    
+    version defaults to the module-level PLAYER_ID_VERSION at call time.
+    """
+    if version is None:
+        version = PLAYER_ID_VERSION
+    return _create_player_id(name, version)
+
+@functools.lru_cache(maxsize=None)
+def _create_player_id(name, version):
+    if not name:
+        return None
+    normalized = normalize_player_name(name)
+    if not normalized:
+        return None
+    # Create 8-character hash
+    if version == 1:
+        return hashlib.md5(normalized.encode()).hexdigest()[:8]
+    return hashlib.blake2b(normalized.encode(), digest_size=4).hexdigest()
+
 class TennisDataProcessor:
-    def __init__(self, data_folder):
+    def __init__(self, data_folder, player_id_version=None):
         self.data_folder = Path(data_folder)
+        self.player_id_version = PLAYER_ID_VERSION if player_id_version is None else player_id_version
         self.raw_folder = self.data_folder / "raw"
         self.processed_folder = self.data_folder / "processed"
         self.processed_folder.mkdir(exist_ok=True)
@@ -22,39 +138,18 @@ class TennisDataProcessor:
         # Player normalization mapping
         self.player_normalization = {}
         self.players_db = {}  # playerId -> {name, hand, birthyear}
-        
-    def normalize_player_name(self, name):
-        """Standardize player names for consistent identification"""
-        if pd.isna(name) or name == "":
-            return None
-            
-        # Remove extra whitespace and convert to title case
-        name = str(name).strip()
-        
-        # Handle common abbreviations and formats
-        name = re.sub(r'\s+', ' ', name)  # Multiple spaces to single
-        
-        # Common name format fixes
-        # "Lastname F." -> "F. Lastname" 
-        if re.match(r'^[A-Z][a-z]+ [A-Z]\.$', name):
-            parts = name.split()
-            name = f"{parts[1]} {parts[0]}"
-        
-        # Handle "Lastname First" -> "First Lastname"
-        # This is tricky, we'll keep current format but standardize case
-        name = ' '.join(word.capitalize() for word in name.split())
-        
-        return name
+        self._written = {}  # output filename -> (rows, columns) written this run
     
-    def create_player_id(self, name):
-        """Create consistent player ID using hash of normalized name"""
-        if not name:
-            return None
-        normalized = self.normalize_player_name(name)
-        if not normalized:
-            return None
-        # Create 8-character hash
-        return hashlib.md5(normalized.encode()).hexdigest()[:8]
+    def resolve_player_names(self, names):
+        """Normalize and look up IDs once per distinct raw name.
+        
+        Returns (raw name -> normalized name, raw name -> player ID) dicts
+        suitable for Series.map.
+        """
+        unique_names = pd.unique(names.dropna())
+        norm_map = {name: normalize_player_name(name) for name in unique_names}
+        id_map = {name: self.player_id_mapping.get(norm_map[name]) for name in unique_names}
+        return norm_map, id_map
     
     def extract_players_from_match_data(self, df):
         """Extract unique players from match data"""
@@ -84,7 +179,10 @@ class TennisDataProcessor:
         
         # Load main match data
         try:
-            atp_df = pd.read_csv(self.raw_folder / "atp_tennis.csv")
+            atp_df = pd.read_csv(
+                self.raw_folder / "atp_tennis.csv", usecols=_PLAYER_COLUMNS,
+                dtype={col: 'string' for col in _PLAYER_COLUMNS}, **_READ_KW
+            )
             all_players.update(self.extract_players_from_match_data(atp_df))
             print(f"Found {len(all_players)} players from ATP matches")
         except FileNotFoundError:
@@ -98,35 +196,40 @@ class TennisDataProcessor:
         
         for file in performance_files:
             try:
-                df = pd.read_csv(self.raw_folder / file)
+                df = pd.read_csv(self.raw_folder / file, **_READ_KW)
                 players_from_file = self.extract_players_from_performance_data(df)
                 all_players.update(players_from_file)
                 print(f"Added {len(players_from_file)} players from {file}")
             except FileNotFoundError:
                 print(f"{file} not found")
         
-        # Create players database
-        players_data = []
+        # Create players database, discarding duplicate IDs on insertion
+        by_id = {}
         for player_name in all_players:
             if player_name and pd.notna(player_name):
-                normalized_name = self.normalize_player_name(player_name)
+                normalized_name = normalize_player_name(player_name)
                 if normalized_name:
-                    player_id = self.create_player_id(normalized_name)
-                    players_data.append({
+                    player_id = create_player_id(normalized_name, self.player_id_version)
+                    by_id.setdefault(player_id, {
                         'player_id': player_id,
                         'name': normalized_name,
                         'hand': None,  # To be filled from additional data sources
                         'birth_year': None  # To be filled from additional data sources
                     })
         
-        # Remove duplicates based on player_id
-        players_df = pd.DataFrame(players_data).drop_duplicates('player_id')
+        players_df = pd.DataFrame.from_records(
+            list(by_id.values()), columns=['player_id', 'name', 'hand', 'birth_year']
+        )
         
         # Create mapping for quick lookups
         self.player_id_mapping = dict(zip(players_df['name'], players_df['player_id']))
         
         # Save players table
-        players_df.to_csv(self.processed_folder / "players.csv", index=False)
+        pacsv.write_csv(
+            pa.Table.from_pandas(players_df, preserve_index=False),
+            str(self.processed_folder / "players.csv")
+        )
+        self._written["players.csv"] = players_df.shape
         print(f"Created players.csv with {len(players_df)} unique players")
         
         return players_df
@@ -138,19 +241,7 @@ class TennisDataProcessor:
             
         surface = str(surface).strip().lower()
         
-        surface_mapping = {
-            'hard': 'Hard',
-            'clay': 'Clay', 
-            'grass': 'Grass',
-            'carpet': 'Carpet',
-            'acrylic': 'Hard',
-            'decoturf': 'Hard',
-            'plexicushion': 'Hard',
-            'rebound ace': 'Hard',
-            'greenset': 'Hard'
-        }
-        
-        return surface_mapping.get(surface, 'Hard')  # Default to Hard
+        return SURFACE_MAPPING.get(surface, 'Hard')  # Default to Hard
     
     def standardize_round(self, round_str):
         """Standardize round names"""
@@ -159,32 +250,17 @@ class TennisDataProcessor:
             
         round_str = str(round_str).strip()
         
-        round_mapping = {
-            '1st Round': 'R1',
-            '2nd Round': 'R2', 
-            '3rd Round': 'R3',
-            '4th Round': 'R4',
-            'Round of 128': 'R1',
-            'Round of 64': 'R2',
-            'Round of 32': 'R3',
-            'Round of 16': 'R4',
-            'Quarterfinals': 'QF',
-            'Quarter-finals': 'QF',
-            'Semifinals': 'SF',
-            'Semi-finals': 'SF',
-            'The Final': 'F',
-            'Final': 'F',
-            'Finals': 'F'
-        }
-        
-        return round_mapping.get(round_str, round_str)
+        return ROUND_MAPPING.get(round_str, round_str)
     
     def process_matches_data(self):
         """Process main ATP matches data"""
         print("\nProcessing ATP matches data...")
         
         try:
-            df = pd.read_csv(self.raw_folder / "atp_tennis.csv")
+            df = pd.read_csv(
+                self.raw_folder / "atp_tennis.csv", usecols=_MATCH_COLUMNS,
+                dtype=_MATCH_DTYPES, parse_dates=['Date'], **_READ_KW
+            )
             print(f"Loaded {len(df)} matches")
         except FileNotFoundError:
             print("atp_tennis.csv not found")
@@ -213,22 +289,27 @@ class TennisDataProcessor:
         
         df = df.rename(columns=column_mapping)
         
-        # Convert date
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
+        # Convert date (normally already parsed on read)
+        if not pd.api.types.is_datetime64_any_dtype(df['date']):
+            df['date'] = pd.to_datetime(df['date'], errors='coerce', cache=True)
         
-        # Standardize surface
-        df['surface'] = df['surface'].apply(self.standardize_surface)
+        # Standardize surface (vectorized standardize_surface)
+        surface = df['surface'].astype('string')
+        df['surface'] = surface.str.strip().str.lower().map(SURFACE_MAPPING).fillna('Hard').where(surface.notna())
         
-        # Standardize round
-        df['round'] = df['round'].apply(self.standardize_round)
+        # Standardize round (vectorized standardize_round)
+        round_str = df['round'].astype('string').str.strip()
+        df['round'] = round_str.map(ROUND_MAPPING).fillna(round_str)
         
         # Convert best_of to integer
         df['best_of'] = pd.to_numeric(df['best_of'], errors='coerce')
         
         # Replace player names with IDs
-        df['p1_id'] = df['player1'].apply(lambda x: self.player_id_mapping.get(self.normalize_player_name(x)))
-        df['p2_id'] = df['player2'].apply(lambda x: self.player_id_mapping.get(self.normalize_player_name(x)))
-        df['winner_id'] = df['winner'].apply(lambda x: self.player_id_mapping.get(self.normalize_player_name(x)))
+        # Resolve each distinct raw name once, then map per row
+        _, id_map = self.resolve_player_names(pd.concat([df['player1'], df['player2'], df['winner']]))
+        df['p1_id'] = df['player1'].map(id_map)
+        df['p2_id'] = df['player2'].map(id_map)
+        df['winner_id'] = df['winner'].map(id_map)
         
         # Remove rows with missing essential data
         initial_count = len(df)
@@ -248,9 +329,24 @@ class TennisDataProcessor:
         
         df = df[final_columns]
         
-        # Save processed matches
-        df.to_csv(self.processed_folder / "matches.csv", index=False)
-        print(f"Saved {len(df)} processed matches to matches.csv")
+        # Store player IDs as int32 codes into a shared player index
+        categories = pd.Categorical(pd.concat([df['p1_id'], df['p2_id'], df['winner_id']])).categories
+        for col in ['p1_id', 'p2_id', 'winner_id']:
+            df[col] = pd.Categorical(df[col], categories=categories).codes.astype('int32')
+        # Record the index size with the codes so a mismatched index is detectable
+        df.attrs['n_players'] = len(categories)
+        
+        # Save processed matches, then the index the codes refer to
+        df.to_parquet(self.processed_folder / "matches.parquet", **_PARQUET_KW)
+        self._written["matches.parquet"] = df.shape
+        print(f"Saved {len(df)} processed matches to matches.parquet")
+        
+        player_index = pd.DataFrame({
+            'code': np.arange(len(categories), dtype='int32'),
+            'player_id': categories
+        })
+        player_index.to_parquet(self.processed_folder / "player_id_index.parquet", **_PARQUET_KW)
+        self._written["player_id_index.parquet"] = player_index.shape
         
         return df
     
@@ -259,60 +355,72 @@ class TennisDataProcessor:
         print("\nProcessing performance data...")
         
         performance_files = {
-            "serve_leaders.csv": "serve_stats.csv",
-            "return_leaders.csv": "return_stats.csv", 
-            "rally_leaders.csv": "rally_stats.csv",
-            "tactics_leaders.csv": "tactics_stats.csv"
+            "serve_leaders.csv": "serve_stats.parquet",
+            "return_leaders.csv": "return_stats.parquet", 
+            "rally_leaders.csv": "rally_stats.parquet",
+            "tactics_leaders.csv": "tactics_stats.parquet"
         }
         
         for input_file, output_file in performance_files.items():
-            try:
-                df = pd.read_csv(self.raw_folder / input_file)
-                print(f"Processing {input_file}...")
-                
-                # Normalize player names and add player IDs
-                df['player_normalized'] = df['Player'].apply(self.normalize_player_name)
-                df['player_id'] = df['player_normalized'].apply(lambda x: self.player_id_mapping.get(x))
-                
-                # Remove rows without player IDs
-                initial_count = len(df)
-                df = df.dropna(subset=['player_id'])
-                final_count = len(df)
-                
-                if initial_count > final_count:
-                    print(f"  Removed {initial_count - final_count} rows with unmatched players")
-                
-                # Clean column names - remove special characters and standardize
-                def clean_column_name(col):
-                    # Remove special characters and normalize spaces
-                    col = re.sub(r'[^\w\s%]', '', str(col))
-                    col = re.sub(r'\s+', '_', col.strip())
-                    col = col.lower()
-                    return col
-                
-                # Rename columns
-                new_columns = {}
-                for col in df.columns:
-                    if col not in ['Player', 'player_normalized', 'player_id']:
-                        new_columns[col] = clean_column_name(col)
-                
-                df = df.rename(columns=new_columns)
-                
-                # Reorder columns to put player info first
-                cols = ['player_id', 'player_normalized'] + [col for col in df.columns if col not in ['Player', 'player_id', 'player_normalized']]
-                df = df[cols]
-                
-                # Drop original player column
-                df = df.drop('Player', axis=1, errors='ignore')
-                
-                # Save processed data
-                df.to_csv(self.processed_folder / output_file, index=False)
-                print(f"  Saved {len(df)} records to {output_file}")
-                
-            except FileNotFoundError:
-                print(f"  {input_file} not found, skipping...")
-            except Exception as e:
-                print(f"  Error processing {input_file}: {e}")
+            shape = self._process_perf_file(input_file, output_file)
+            if shape is not None:
+                self._written[output_file] = shape
+    
+    def _process_perf_file(self, input_file, output_file):
+        """Process one performance file; returns the (rows, columns) written or None"""
+        try:
+            df = pd.read_csv(self.raw_folder / input_file, **_READ_KW)
+            print(f"Processing {input_file}...")
+            
+            # Normalize player names and add player IDs
+            norm_map, id_map = self.resolve_player_names(df['Player'])
+            df['player_normalized'] = df['Player'].map(norm_map)
+            df['player_id'] = df['Player'].map(id_map)
+            
+            # Remove rows without player IDs
+            initial_count = len(df)
+            df = df.dropna(subset=['player_id'])
+            final_count = len(df)
+            
+            if initial_count > final_count:
+                print(f"  Removed {initial_count - final_count} rows with unmatched players")
+            
+            # Rename columns
+            new_columns = {}
+            for col in df.columns:
+                if col not in ['Player', 'player_normalized', 'player_id']:
+                    new_columns[col] = clean_column_name(col)
+            
+            df = df.rename(columns=new_columns)
+            
+            # Reorder columns to put player info first
+            cols = ['player_id', 'player_normalized'] + [col for col in df.columns if col not in ['Player', 'player_id', 'player_normalized']]
+            df = df[cols]
+            
+            # Drop original player column
+            df = df.drop('Player', axis=1, errors='ignore')
+            
+            # Save processed data
+            df.to_parquet(self.processed_folder / output_file, **_PARQUET_KW)
+            print(f"  Saved {len(df)} records to {output_file}")
+            return df.shape
+            
+        except FileNotFoundError:
+            print(f"  {input_file} not found, skipping...")
+        except Exception as e:
+            print(f"  Error processing {input_file}: {e}")
+        return None
+    
+    def _table_shape(self, file):
+        """(rows, columns) of a processed file without parsing its data"""
+        if file.suffix == ".parquet":
+            metadata = pq.read_metadata(file)
+            return metadata.num_rows, metadata.num_columns
+        
+        # Stream record batches so quoted multi-line fields count as one row
+        reader = pacsv.open_csv(file)
+        rows = sum(batch.num_rows for batch in reader)
+        return rows, len(reader.schema)
     
     def generate_summary_report(self):
         """Generate a summary report of the processing"""
@@ -321,12 +429,12 @@ class TennisDataProcessor:
         print("="*50)
         
         # Check processed files
-        processed_files = list(self.processed_folder.glob("*.csv"))
+        processed_files = sorted(self.processed_folder.glob("*.csv")) + sorted(self.processed_folder.glob("*.parquet"))
         
         for file in processed_files:
             try:
-                df = pd.read_csv(file)
-                print(f"{file.name}: {len(df)} rows, {len(df.columns)} columns")
+                rows, cols = self._written.get(file.name) or self._table_shape(file)
+                print(f"{file.name}: {rows} rows, {cols} columns")
             except Exception as e:
                 print(f"{file.name}: Error reading - {e}")
         
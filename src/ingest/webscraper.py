@@ -3,35 +3,88 @@ from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree, html as lxml_html
+import requests
 import csv
-import time
 import os
 
 # Define the output folder for CSV files (relative to your project)
 DATA_FOLDER = os.path.join(os.path.dirname(__file__), "..", "..", "data", "raw")
 os.makedirs(DATA_FOLDER, exist_ok=True)  # Ensure the folder exists
 
-# Function to scrape a single URL
-def scrape_tennis_data(url, output_filename):
-    # 1. Set up Selenium WebDriver with options
+# Fall back to a headless browser when the table is not in the static HTML
+USE_SELENIUM_FALLBACK = True
+REQUEST_TIMEOUT = 10
+
+# Write extracted headers and rows to a CSV in the 'data' folder
+def write_table_csv(headers, rows_data, output_filename):
+    csv_filename = os.path.join(DATA_FOLDER, output_filename)
+    with open(csv_filename, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        writer.writerows(rows_data)
+
+    print(f"Data successfully written to {csv_filename}")
+    print(f"Scraped {len(rows_data)} rows of data")
+
+# Same text as BeautifulSoup's get_text(strip=True)
+def _cell_text(element):
+    return ''.join(text.strip() for text in element.itertext())
+
+# Scrape a single URL from its static HTML; returns False if the table or its rows are missing
+def scrape_static(url, output_filename):
+    response = requests.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    tree = lxml_html.fromstring(response.content)
+    tables = tree.xpath('//table[@id="reportable"]')
+    if not tables:
+        return False
+    maintable = tables[0]
+
+    headers = [_cell_text(th) for th in maintable.xpath('./thead/tr[1]/th')]
+    if not headers:
+        return False
+
+    rows_data = []
+    for row in maintable.xpath('./tbody/tr | ./tr'):
+        cells = row.xpath('./td')
+        if cells:
+            rows_data.append([_cell_text(cell) for cell in cells])
+
+    # Rows filled in later by JavaScript: leave it to the browser
+    if not rows_data:
+        return False
+
+    print(f"Extracted Headers for {url}: {headers}")
+
+    write_table_csv(headers, rows_data, output_filename)
+    return True
+
+# Set up a headless Selenium Chrome WebDriver
+def create_driver():
     from selenium.webdriver.chrome.options import Options
     chrome_options = Options()
     chrome_options.add_argument("--headless")  # Run in background
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
-    
-    driver = None
+    return webdriver.Chrome(options=chrome_options)
+
+# Function to scrape a single URL with an existing driver
+def scrape_tennis_data(url, output_filename, driver):
     try:
-        driver = webdriver.Chrome(options=chrome_options)
+        # 1. Load the page
         driver.get(url)
 
         # 2. Wait for the table to load
         wait = WebDriverWait(driver, 10)
         wait.until(EC.presence_of_element_located((By.ID, "reportable")))
 
-        # 3. Parse the Rendered HTML with BeautifulSoup
-        soup = BeautifulSoup(driver.page_source, 'html.parser')
+        # 3. Parse only the target table of the rendered HTML with BeautifulSoup
+        only_table = SoupStrainer('table', id='reportable')
+        soup = BeautifulSoup(driver.page_source, 'lxml', parse_only=only_table)
 
         # 4. Locate the Outer Table (maintable)
         maintable = soup.find('table', {'id': 'reportable'})
@@ -64,15 +117,30 @@ def scrape_tennis_data(url, output_filename):
                         rows_data.append(row_values)
 
         # 8. Write to CSV in the 'data' folder
-        csv_filename = os.path.join(DATA_FOLDER, output_filename)
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(headers)
-            writer.writerows(rows_data)
+        write_table_csv(headers, rows_data, output_filename)
+
+    except Exception as e:
+        print(f"Error scraping {url}: {str(e)}")
+
+# Scrape a single URL, statically if possible, otherwise with its own driver
+# (safe to run in a worker thread)
+def scrape_one(url, output_filename):
+    try:
+        if scrape_static(url, output_filename):
+            return
+    except requests.RequestException as e:
+        print(f"Static fetch failed for {url}: {str(e)}")
+    except etree.ParserError as e:
+        print(f"Static parse failed for {url}: {str(e)}")
 
-        print(f"Data successfully written to {csv_filename}")
-        print(f"Scraped {len(rows_data)} rows of data")
+    if not USE_SELENIUM_FALLBACK:
+        print(f"Error scraping {url}: table not found in static HTML")
+        return
 
+    driver = None
+    try:
+        driver = create_driver()
+        scrape_tennis_data(url, output_filename, driver)
     except Exception as e:
         print(f"Error scraping {url}: {str(e)}")
     finally:
@@ -88,11 +156,14 @@ urls = [
     "https://tennisabstract.com/reports/mcp_leaders_tactics_men_last52.html"
 ]
 
-# Scrape each URL and save to a separate CSV file
+# Scrape all URLs concurrently, each into a separate CSV file
 if __name__ == "__main__":
     filenames = ["serve_leaders.csv", "return_leaders.csv", "rally_leaders.csv", "tactics_leaders.csv"]
     
-    for url, filename in zip(urls, filenames):
-        print(f"Scraping {url}...")
-        scrape_tennis_data(url, filename)
-        time.sleep(2)  # Be respectful to the server
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=4) as ex:
+        futures = []
+        for url, filename in zip(urls, filenames):
+            print(f"Scraping {url}...")
+            futures.append(ex.submit(scrape_one, url, filename))
+        for future in futures:
+            future.result()
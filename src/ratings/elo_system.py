@@ -2,136 +2,226 @@
 Final Tennis Elo System - With Surface Ratings + Save Functionality
 """
 
+import math
+import numpy as np
 import pandas as pd
-from collections import defaultdict
+from numba import njit
 from pathlib import Path
 import time
 
+# Surface ratings are stored column-wise in this order
+SURFACES = ['Hard', 'Clay', 'Grass', 'Carpet']
+SURFACE_INDEX = {surface: i for i, surface in enumerate(SURFACES)}
+
+_PARQUET_KW = dict(engine='pyarrow', compression='snappy', index=False)
+
+# 10 ** (diff / 400) == exp(diff * ln(10) / 400)
+LN10_OVER_400 = 2.302585092994046 / 400.0
+
+@njit(cache=True)
+def _expected_probability(rating_a, rating_b):
+    return 1.0 / (1.0 + math.exp(LN10_OVER_400 * (rating_b - rating_a)))
+
+@njit(cache=True)
+def _update_match(winner, loser, surface, overall, surf_ratings, matches_played, k):
+    """Apply one match in place and return the pre-match ratings"""
+    ro_w = overall[winner]
+    ro_l = overall[loser]
+    rs_w = surf_ratings[winner, surface]
+    rs_l = surf_ratings[loser, surface]
+    
+    # Update overall ratings
+    d = k * (1.0 - _expected_probability(ro_w, ro_l))
+    overall[winner] += d
+    overall[loser] -= d
+    
+    # Update surface-specific ratings
+    d = k * (1.0 - _expected_probability(rs_w, rs_l))
+    surf_ratings[winner, surface] += d
+    surf_ratings[loser, surface] -= d
+    
+    # Update match counts
+    matches_played[winner] += 1
+    matches_played[loser] += 1
+    
+    return ro_w, ro_l, rs_w, rs_l
+
+@njit(cache=True)
+def elo_run(winner_idx, loser_idx, surface_idx, overall, surf_ratings, matches_played, k, n):
+    """Run the Elo updates for n date-ordered matches.
+    
+    Ratings arrays are updated in place; returns the pre-match overall and
+    surface ratings of winner and loser for every match.
+    """
+    w_over_pre = np.empty(n)
+    l_over_pre = np.empty(n)
+    w_surf_pre = np.empty(n)
+    l_surf_pre = np.empty(n)
+    for i in range(n):
+        ro_w, ro_l, rs_w, rs_l = _update_match(
+            winner_idx[i], loser_idx[i], surface_idx[i],
+            overall, surf_ratings, matches_played, k
+        )
+        w_over_pre[i] = ro_w
+        l_over_pre[i] = ro_l
+        w_surf_pre[i] = rs_w
+        l_surf_pre[i] = rs_l
+    return w_over_pre, l_over_pre, w_surf_pre, l_surf_pre
+
 class TennisEloSystem:
     def __init__(self, initial_rating=1500, k_factor=32):
         self.initial_rating = initial_rating
         self.k_factor = k_factor
         
-        # Player ratings: overall + per surface
-        self.ratings = defaultdict(lambda: {
-            'overall': initial_rating,
-            'Hard': initial_rating,
-            'Clay': initial_rating,
-            'Grass': initial_rating,
-            'Carpet': initial_rating,
-            'matches_played': 0
-        })
+        # Player ratings: overall + per surface, indexed by player code
+        self._init_ratings(np.array([], dtype=object))
         
-        # Store rating snapshots for each match (for ML features)
-        self.match_ratings = []
+        # Rating snapshots for each match (for ML features), one typed array per column
+        self._set_match_ratings(
+            np.array([], dtype='datetime64[ns]'), np.array([], dtype=np.int8),
+            np.array([], dtype=np.int32), np.array([], dtype=np.int32),
+            np.array([]), np.array([]), np.array([]), np.array([])
+        )
+    
+    def _init_ratings(self, player_ids):
+        """Allocate rating arrays for the given (sorted, unique) player IDs"""
+        n_players = len(player_ids)
+        self.player_ids = player_ids
+        self.overall = np.full(n_players, float(self.initial_rating))
+        self.surface_ratings = np.full((n_players, len(SURFACES)), float(self.initial_rating))
+        self.matches_played = np.zeros(n_players, dtype=np.int32)
+    
+    def _set_match_ratings(self, dates, surface_idx, winner_idx, loser_idx,
+                           w_over_pre, l_over_pre, w_surf_pre, l_surf_pre):
+        """Store the per-match pre-match rating arrays"""
+        self._mr_date = dates
+        self._mr_surface = surface_idx.astype(np.int8)
+        self._mr_widx = winner_idx.astype(np.int32)
+        self._mr_lidx = loser_idx.astype(np.int32)
+        self._mr_wover = w_over_pre
+        self._mr_lover = l_over_pre
+        self._mr_wsurf = w_surf_pre
+        self._mr_lsurf = l_surf_pre
     
     def expected_probability(self, rating_a, rating_b):
-        return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
+        return _expected_probability(float(rating_a), float(rating_b))
     
-    def update_ratings(self, winner_id, loser_id, surface, date, match_idx):
-        # Get current ratings
-        winner_overall = self.ratings[winner_id]['overall']
-        loser_overall = self.ratings[loser_id]['overall']
-        winner_surface = self.ratings[winner_id][surface]
-        loser_surface = self.ratings[loser_id][surface]
+    def update_ratings(self, winner, loser, surface):
+        """Update ratings for one match; winner/loser/surface are integer codes.
         
-        # Store pre-match ratings (for ML features)
-        self.match_ratings.append({
-            'match_idx': match_idx,
-            'date': date,
-            'surface': surface,
-            'winner_id': winner_id,
-            'loser_id': loser_id,
-            'winner_elo_overall': winner_overall,
-            'loser_elo_overall': loser_overall,
-            'winner_elo_surface': winner_surface,
-            'loser_elo_surface': loser_surface
-        })
+        Returns the pre-match (winner overall, loser overall, winner surface,
+        loser surface) ratings.
+        """
+        return _update_match(winner, loser, surface, self.overall, self.surface_ratings,
+                             self.matches_played, float(self.k_factor))
+    
+    def process_matches(self, matches_df, player_ids=None):
+        """Run Elo over all matches in date order.
         
-        # Update overall ratings
-        expected_overall = self.expected_probability(winner_overall, loser_overall)
-        change_overall = self.k_factor * (1 - expected_overall)
+        If player_ids is given, the p1_id/p2_id/winner_id columns hold integer
+        codes into it (as written by the data processor); otherwise they hold
+        the player IDs themselves.
+        """
+        print(f"Processing {len(matches_df):,} matches with Elo system...")
         
-        self.ratings[winner_id]['overall'] += change_overall
-        self.ratings[loser_id]['overall'] -= change_overall
+        # Sort by date (already typed when loaded from Parquet)
+        matches_df = matches_df.sort_values('date').copy()
+        if not pd.api.types.is_datetime64_any_dtype(matches_df['date']):
+            matches_df['date'] = pd.to_datetime(matches_df['date'], cache=True)
         
-        # Update surface-specific ratings
-        expected_surface = self.expected_probability(winner_surface, loser_surface)
-        change_surface = self.k_factor * (1 - expected_surface)
+        # Pull columns out as contiguous arrays
+        winners = matches_df['winner_id'].to_numpy()
+        p1 = matches_df['p1_id'].to_numpy()
+        p2 = matches_df['p2_id'].to_numpy()
         
-        self.ratings[winner_id][surface] += change_surface
-        self.ratings[loser_id][surface] -= change_surface
+        # Matches won by neither listed player are dropped in bulk
+        p1_won = winners == p1
+        valid = p1_won | (winners == p2)
+        n = len(matches_df)
+        processed = int(valid.sum())
+        skipped = n - processed
+        p1_won = p1_won[valid]
+        p1 = p1[valid]
+        p2 = p2[valid]
+        dates = matches_df['date'].to_numpy()[valid]
+        surface_names = matches_df['surface'][valid]
         
-        # Update match counts
-        self.ratings[winner_id]['matches_played'] += 1
-        self.ratings[loser_id]['matches_played'] += 1
-    
-    def process_matches(self, matches_df):
-        print(f"Processing {len(matches_df):,} matches with Elo system...")
+        surface_codes = surface_names.map(SURFACE_INDEX)
+        if surface_codes.isna().any():
+            unknown = sorted(surface_names[surface_codes.isna()].astype(str).unique())
+            raise ValueError(f"Unknown surface(s): {unknown}")
+        surface_idx = surface_codes.to_numpy(dtype=np.int64)
         
-        # Sort by date
-        matches_df = matches_df.sort_values('date').copy()
-        matches_df['date'] = pd.to_datetime(matches_df['date'])
+        # Integer-code players once so the kernel only does array indexing
+        if player_ids is None:
+            player_ids, codes = np.unique(np.concatenate([p1, p2]), return_inverse=True)
+            p1 = codes[:processed]
+            p2 = codes[processed:]
+        else:
+            # The kernel does no bounds checking, so validate codes up front
+            n_players = len(player_ids)
+            for codes in (p1, p2):
+                if not np.issubdtype(codes.dtype, np.integer):
+                    raise ValueError(f"Player codes must be integers, got {codes.dtype}")
+                if len(codes) and (codes.min() < 0 or codes.max() >= n_players):
+                    raise ValueError(
+                        f"Player codes out of range [0, {n_players}): "
+                        f"min {codes.min()}, max {codes.max()}"
+                    )
+        self._init_ratings(np.asarray(player_ids))
+        winner_idx = np.where(p1_won, p1, p2)
+        loser_idx = np.where(p1_won, p2, p1)
         
         start_time = time.time()
-        processed = 0
-        skipped = 0
-        
-        for idx, (_, match) in enumerate(matches_df.iterrows()):
-            # Progress every 5000 matches
-            if (idx + 1) % 5000 == 0:
-                elapsed = time.time() - start_time
-                rate = (idx + 1) / elapsed if elapsed > 0 else 0
-                print(f"Progress: {idx+1:,}/{len(matches_df)} ({(idx+1)/len(matches_df)*100:.1f}%) - "
-                      f"{rate:.0f} matches/sec")
-            
-            # Get match details
-            winner_id = match['winner_id']
-            p1_id = match['p1_id']
-            p2_id = match['p2_id']
-            surface = match['surface']
-            date = match['date']
-            
-            # Determine loser
-            if winner_id == p1_id:
-                loser_id = p2_id
-            elif winner_id == p2_id:
-                loser_id = p1_id
-            else:
-                skipped += 1
-                continue
-            
-            # Update ratings
-            self.update_ratings(winner_id, loser_id, surface, date, processed)
-            processed += 1
+        
+        w_over_pre, l_over_pre, w_surf_pre, l_surf_pre = elo_run(
+            winner_idx, loser_idx, surface_idx,
+            self.overall, self.surface_ratings, self.matches_played,
+            float(self.k_factor), processed
+        )
         
         total_time = time.time() - start_time
+        
+        # Store pre-match ratings (for ML features)
+        self._set_match_ratings(dates, surface_idx, winner_idx, loser_idx,
+                                w_over_pre, l_over_pre, w_surf_pre, l_surf_pre)
+        
         print(f"\nCompleted in {total_time:.1f} seconds!")
         print(f"Processed: {processed:,} matches")
         print(f"Skipped: {skipped} matches")
-        print(f"Players tracked: {len(self.ratings)}")
-        print(f"Speed: {processed/total_time:.0f} matches/second")
+        print(f"Players tracked: {len(self.player_ids)}")
+        if total_time > 0:
+            print(f"Speed: {processed/total_time:.0f} matches/second")
         
         return processed
     
     def get_ratings_df(self):
         """Convert ratings to DataFrame"""
-        ratings_data = []
-        for player_id, ratings in self.ratings.items():
-            ratings_data.append({
-                'player_id': player_id,
-                'elo_overall': ratings['overall'],
-                'elo_hard': ratings['Hard'],
-                'elo_clay': ratings['Clay'],
-                'elo_grass': ratings['Grass'],
-                'elo_carpet': ratings['Carpet'],
-                'matches_played': ratings['matches_played']
-            })
-        return pd.DataFrame(ratings_data)
+        ratings_df = pd.DataFrame({
+            'player_id': self.player_ids,
+            'elo_overall': self.overall,
+            'elo_hard': self.surface_ratings[:, SURFACE_INDEX['Hard']],
+            'elo_clay': self.surface_ratings[:, SURFACE_INDEX['Clay']],
+            'elo_grass': self.surface_ratings[:, SURFACE_INDEX['Grass']],
+            'elo_carpet': self.surface_ratings[:, SURFACE_INDEX['Carpet']],
+            'matches_played': self.matches_played
+        })
+        # A player index can include players without a rated match
+        return ratings_df[ratings_df['matches_played'] > 0].reset_index(drop=True)
     
     def get_match_ratings_df(self):
         """Convert match ratings to DataFrame"""
-        return pd.DataFrame(self.match_ratings)
+        return pd.DataFrame({
+            'match_idx': np.arange(len(self._mr_widx)),
+            'date': self._mr_date,
+            'surface': np.array(SURFACES, dtype=object)[self._mr_surface],
+            'winner_id': self.player_ids[self._mr_widx],
+            'loser_id': self.player_ids[self._mr_lidx],
+            'winner_elo_overall': self._mr_wover,
+            'loser_elo_overall': self._mr_lover,
+            'winner_elo_surface': self._mr_wsurf,
+            'loser_elo_surface': self._mr_lsurf
+        })
     
     def save_results(self, output_folder="data/features"):
         """Save ratings and match history"""
@@ -140,55 +230,70 @@ class TennisEloSystem:
         
         # Save current ratings
         ratings_df = self.get_ratings_df()
-        ratings_df.to_csv(output_path / "elo_ratings.csv", index=False)
+        ratings_df.to_parquet(output_path / "elo_ratings.parquet", **_PARQUET_KW)
         print(f"Saved current ratings: {len(ratings_df)} players")
         
         # Save match-by-match ratings history
         match_ratings_df = self.get_match_ratings_df()
-        match_ratings_df.to_csv(output_path / "match_ratings.csv", index=False)
+        match_ratings_df.to_parquet(output_path / "match_ratings.parquet", **_PARQUET_KW)
         print(f"Saved match ratings: {len(match_ratings_df):,} matches")
         
         # Show top players by overall Elo
         print(f"\nTop 15 players by overall Elo:")
         top_players = ratings_df.nlargest(15, 'elo_overall')
-        for i, (_, player) in enumerate(top_players.iterrows(), 1):
-            print(f"{i:2d}. {player['player_id']}: {player['elo_overall']:.0f} "
-                  f"({player['matches_played']} matches)")
+        top_rows = top_players[['player_id', 'elo_overall', 'matches_played']].itertuples(index=False, name=None)
+        for i, (player_id, elo_overall, matches_played) in enumerate(top_rows, 1):
+            print(f"{i:2d}. {player_id}: {elo_overall:.0f} "
+                  f"({matches_played} matches)")
         
         # Show surface specialists
         print(f"\nClay specialists (Clay - Overall):")
         ratings_df['clay_advantage'] = ratings_df['elo_clay'] - ratings_df['elo_overall']
         clay_specialists = ratings_df.nlargest(5, 'clay_advantage')
-        for _, player in clay_specialists.iterrows():
-            if player['matches_played'] >= 20:  # Minimum matches
-                print(f"{player['player_id']}: Clay {player['elo_clay']:.0f} "
-                      f"vs Overall {player['elo_overall']:.0f} "
-                      f"(+{player['clay_advantage']:.0f})")
+        clay_rows = clay_specialists[
+            ['player_id', 'elo_clay', 'elo_overall', 'clay_advantage', 'matches_played']
+        ].itertuples(index=False, name=None)
+        for player_id, elo_clay, elo_overall, clay_advantage, matches_played in clay_rows:
+            if matches_played >= 20:  # Minimum matches
+                print(f"{player_id}: Clay {elo_clay:.0f} "
+                      f"vs Overall {elo_overall:.0f} "
+                      f"(+{clay_advantage:.0f})")
         
         return ratings_df, match_ratings_df
 
 def main():
     # Load match data
     try:
-        matches_df = pd.read_csv("data/processed/matches.csv")
+        matches_df = pd.read_parquet(
+            "data/processed/matches.parquet", engine='pyarrow',
+            columns=['date', 'surface', 'winner_id', 'p1_id', 'p2_id']
+        )
+        player_ids = pd.read_parquet(
+            "data/processed/player_id_index.parquet", engine='pyarrow', columns=['player_id']
+        )['player_id'].to_numpy()
+        n_players = matches_df.attrs.get('n_players')
+        if n_players is not None and n_players != len(player_ids):
+            print(f"Error: player_id_index.parquet has {len(player_ids)} players, "
+                  f"matches.parquet was coded against {n_players}!")
+            return
         print(f"Loaded {len(matches_df):,} matches")
-    except FileNotFoundError:
-        print("Error: data/processed/matches.csv not found!")
+    except FileNotFoundError as e:
+        print(f"Error: {e.filename} not found!")
         return
     
     # Create Elo system
     elo_system = TennisEloSystem(initial_rating=1500, k_factor=32)
     
     # Process all matches
-    processed_count = elo_system.process_matches(matches_df)
+    processed_count = elo_system.process_matches(matches_df, player_ids)
     
     # Save results
     ratings_df, match_ratings_df = elo_system.save_results()
     
     print(f"\n🎾 Elo rating system complete!")
     print(f"Files saved to data/features/:")
-    print(f"  - elo_ratings.csv ({len(ratings_df)} players)")
-    print(f"  - match_ratings.csv ({len(match_ratings_df):,} matches)")
+    print(f"  - elo_ratings.parquet ({len(ratings_df)} players)")
+    print(f"  - match_ratings.parquet ({len(match_ratings_df):,} matches)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file